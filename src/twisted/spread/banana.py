@@ -14,13 +14,13 @@ for more details.
 
 from __future__ import absolute_import, division
 
-import copy, struct
+import copy, re, struct
 from io import BytesIO
 
 from twisted.internet import protocol
 from twisted.persisted import styles
 from twisted.python import log
-from twisted.python.compat import iterbytes, long, _bytesChr as chr
+from twisted.python.compat import long
 from twisted.python.reflect import fullyQualifiedName
 
 class BananaError(Exception):
@@ -28,12 +28,14 @@ class BananaError(Exception):
 
 def int2b128(integer, stream):
     if integer == 0:
-        stream(chr(0))
+        stream(b'\x00')
         return
     assert integer > 0, "can only encode positive integers"
+    encoded = bytearray()
     while integer:
-        stream(chr(integer & 0x7f))
+        encoded.append(integer & 0x7f)
         integer = integer >> 7
+    stream(bytes(encoded))
 
 
 def b1282int(st):
@@ -49,26 +51,54 @@ def b1282int(st):
     """
     e = 1
     i = 0
-    for char in iterbytes(st):
-        n = ord(char)
+    for n in bytearray(st):
         i += (n * e)
         e <<= 7
     return i
 
 
 # delimiter characters.
-LIST     = chr(0x80)
-INT      = chr(0x81)
-STRING   = chr(0x82)
-NEG      = chr(0x83)
-FLOAT    = chr(0x84)
+LIST     = b'\x80'
+INT      = b'\x81'
+STRING   = b'\x82'
+NEG      = b'\x83'
+FLOAT    = b'\x84'
 # "optional" -- these might be refused by a low-level implementation.
-LONGINT  = chr(0x85)
-LONGNEG  = chr(0x86)
+LONGINT  = b'\x85'
+LONGNEG  = b'\x86'
 # really optional; this is part of the 'pb' vocabulary
-VOCAB    = chr(0x87)
+VOCAB    = b'\x87'
 
-HIGH_BIT_SET = chr(0x80)
+HIGH_BIT_SET = b'\x80'
+
+# Find the type byte which ends a token's prefix.  Searching with a compiled
+# pattern scans the prefix in C rather than one byte at a time in Python.
+_searchTypeByte = re.compile(b'[\x80-\xff]').search
+
+
+def _encodePrefix(integer):
+    """
+    Encode a non-negative integer as a Banana prefix.
+
+    @param integer: The integer to encode.
+    @type integer: L{int}
+
+    @return: The base-128 encoding of C{integer}.
+    @rtype: L{bytes}
+    """
+    encoded = []
+    int2b128(integer, encoded.append)
+    return b''.join(encoded)
+
+
+# Most lengths, vocabulary symbols and integers that are sent are small, so
+# the encodings of numbers with a single byte of prefix are computed once
+# here.  _smallIntTokens holds complete INT and NEG tokens and is indexed by
+# the integer itself: negative integers use negative indices.
+_smallPrefixes = tuple(_encodePrefix(n) for n in range(0x80))
+_smallIntTokens = tuple(
+    [prefix + INT for prefix in _smallPrefixes] +
+    [_smallPrefixes[-n] + NEG for n in range(-0x7f, 0)])
 
 def setPrefixLimit(limit):
     """
@@ -178,76 +208,139 @@ class Banana(protocol.Protocol, styles.Ephemeral):
         buffer = self.buffer + chunk
         listStack = self.listStack
         gotItem = self.gotItem
-        while buffer:
-            assert self.buffer != buffer, "This ain't right: %s %s" % (repr(self.buffer), repr(buffer))
-            self.buffer = buffer
-            pos = 0
-            for ch in iterbytes(buffer):
-                if ch >= HIGH_BIT_SET:
-                    break
-                pos = pos + 1
-            else:
-                if pos > self.prefixLimit:
-                    raise BananaError("Security precaution: more than %d bytes of prefix" % (self.prefixLimit,))
-                return
-            num = buffer[:pos]
-            typebyte = buffer[pos:pos+1]
-            rest = buffer[pos+1:]
-            if len(num) > self.prefixLimit:
-                raise BananaError("Security precaution: longer than %d bytes worth of prefix" % (self.prefixLimit,))
-            if typebyte == LIST:
-                num = b1282int(num)
-                if num > SIZE_LIMIT:
-                    raise BananaError("Security precaution: List too long.")
-                listStack.append((num, []))
-                buffer = rest
-            elif typebyte == STRING:
-                num = b1282int(num)
-                if num > SIZE_LIMIT:
-                    raise BananaError("Security precaution: String too long.")
-                if len(rest) >= num:
-                    buffer = rest[num:]
-                    gotItem(rest[:num])
-                else:
+        typeByteHandlers = self._typeByteHandlers
+        prefixLimit = self.prefixLimit
+        offset = 0
+        try:
+            while offset < len(buffer):
+                # Only look as far as the longest prefix we would accept.
+                match = _searchTypeByte(
+                    buffer, offset, offset + prefixLimit + 1)
+                if match is None:
+                    if len(buffer) - offset > prefixLimit:
+                        raise BananaError(
+                            "Security precaution: more than %d bytes of "
+                            "prefix" % (prefixLimit,))
                     return
-            elif typebyte == INT:
-                buffer = rest
-                num = b1282int(num)
-                gotItem(num)
-            elif typebyte == LONGINT:
-                buffer = rest
-                num = b1282int(num)
-                gotItem(num)
-            elif typebyte == LONGNEG:
-                buffer = rest
-                num = b1282int(num)
-                gotItem(-num)
-            elif typebyte == NEG:
-                buffer = rest
-                num = -b1282int(num)
-                gotItem(num)
-            elif typebyte == VOCAB:
-                buffer = rest
-                num = b1282int(num)
-                item = self.incomingVocabulary[num]
-                if self.currentDialect == b'pb':
-                    # the sender issues VOCAB only for dialect pb
-                    gotItem(item)
-                else:
+                pos = match.start()
+                typebyte = match.group()
+                handler = typeByteHandlers[ord(typebyte)]
+                if handler is None:
                     raise NotImplementedError(
-                        "Invalid item for pb protocol {0!r}".format(item))
-            elif typebyte == FLOAT:
-                if len(rest) >= 8:
-                    buffer = rest[8:]
-                    gotItem(struct.unpack("!d", rest[:8])[0])
-                else:
+                        ("Invalid Type Byte %r" % (typebyte,)))
+                end = handler(self, buffer[offset:pos], buffer, pos + 1)
+                if end is None:
                     return
-            else:
-                raise NotImplementedError(("Invalid Type Byte %r" % (typebyte,)))
-            while listStack and (len(listStack[-1][1]) == listStack[-1][0]):
-                item = listStack.pop()[1]
-                gotItem(item)
-        self.buffer = b''
+                offset = end
+                while listStack and (
+                        len(listStack[-1][1]) == listStack[-1][0]):
+                    item = listStack.pop()[1]
+                    gotItem(item)
+        finally:
+            self.buffer = buffer[offset:]
+
+
+    def _receiveList(self, num, buffer, offset):
+        """
+        Handle a C{LIST} token by starting a new list on the list stack.
+
+        @param num: The base-128 encoded length of the list.
+        @type num: L{bytes}
+
+        @param buffer: The bytes being parsed.
+        @type buffer: L{bytes}
+
+        @param offset: The index in C{buffer} of the first byte following the
+            type byte.
+        @type offset: L{int}
+
+        @return: The index in C{buffer} at which parsing should continue, or
+            L{None} if more bytes must be received before the token can be
+            handled.
+        """
+        num = b1282int(num)
+        if num > SIZE_LIMIT:
+            raise BananaError("Security precaution: List too long.")
+        self.listStack.append((num, []))
+        return offset
+
+
+    def _receiveString(self, num, buffer, offset):
+        """
+        Handle a C{STRING} token.
+
+        @see: L{_receiveList}
+        """
+        num = b1282int(num)
+        if num > SIZE_LIMIT:
+            raise BananaError("Security precaution: String too long.")
+        end = offset + num
+        if len(buffer) >= end:
+            self.gotItem(buffer[offset:end])
+            return end
+        return None
+
+
+    def _receiveInt(self, num, buffer, offset):
+        """
+        Handle an C{INT} or C{LONGINT} token.
+
+        @see: L{_receiveList}
+        """
+        self.gotItem(b1282int(num))
+        return offset
+
+
+    def _receiveNeg(self, num, buffer, offset):
+        """
+        Handle a C{NEG} or C{LONGNEG} token.
+
+        @see: L{_receiveList}
+        """
+        self.gotItem(-b1282int(num))
+        return offset
+
+
+    def _receiveVocab(self, num, buffer, offset):
+        """
+        Handle a C{VOCAB} token.
+
+        @see: L{_receiveList}
+        """
+        item = self.incomingVocabulary[b1282int(num)]
+        if self.currentDialect == b'pb':
+            # the sender issues VOCAB only for dialect pb
+            self.gotItem(item)
+        else:
+            raise NotImplementedError(
+                "Invalid item for pb protocol {0!r}".format(item))
+        return offset
+
+
+    def _receiveFloat(self, num, buffer, offset):
+        """
+        Handle a C{FLOAT} token.
+
+        @see: L{_receiveList}
+        """
+        if len(buffer) >= offset + 8:
+            self.gotItem(struct.unpack_from("!d", buffer, offset)[0])
+            return offset + 8
+        return None
+
+
+    # Token handlers indexed by the integer value of their type byte, so
+    # dataReceived can dispatch with a single tuple lookup.
+    _typeByteHandlers = [None] * 256
+    _typeByteHandlers[ord(LIST)] = _receiveList
+    _typeByteHandlers[ord(STRING)] = _receiveString
+    _typeByteHandlers[ord(INT)] = _receiveInt
+    _typeByteHandlers[ord(LONGINT)] = _receiveInt
+    _typeByteHandlers[ord(NEG)] = _receiveNeg
+    _typeByteHandlers[ord(LONGNEG)] = _receiveNeg
+    _typeByteHandlers[ord(VOCAB)] = _receiveVocab
+    _typeByteHandlers[ord(FLOAT)] = _receiveFloat
+    _typeByteHandlers = tuple(_typeByteHandlers)
 
 
     def expressionReceived(self, lst):
@@ -318,26 +411,31 @@ class Banana(protocol.Protocol, styles.Ephemeral):
 
         @return: L{None}
         """
-        encodeStream = BytesIO()
-        self._encode(obj, encodeStream.write)
-        value = encodeStream.getvalue()
-        self.transport.write(value)
+        encoded = []
+        self._encode(obj, encoded.append)
+        self.transport.write(b''.join(encoded))
 
 
     def _encode(self, obj, write):
         if isinstance(obj, (list, tuple)):
-            if len(obj) > SIZE_LIMIT:
+            length = len(obj)
+            if length > SIZE_LIMIT:
                 raise BananaError(
-                    "list/tuple is too long to send (%d)" % (len(obj),))
-            int2b128(len(obj), write)
+                    "list/tuple is too long to send (%d)" % (length,))
+            if length < 0x80:
+                write(_smallPrefixes[length])
+            else:
+                int2b128(length, write)
             write(LIST)
             for elem in obj:
                 self._encode(elem, write)
         elif isinstance(obj, (int, long)):
-            if obj < self._smallestLongInt or obj > self._largestLongInt:
+            if -0x80 < obj < 0x80:
+                write(_smallIntTokens[obj])
+            elif obj < self._smallestLongInt or obj > self._largestLongInt:
                 raise BananaError(
                     "int/long is too large to send (%d)" % (obj,))
-            if obj < self._smallestInt:
+            elif obj < self._smallestInt:
                 int2b128(-obj, write)
                 write(LONGNEG)
             elif obj < 0:
@@ -356,13 +454,20 @@ class Banana(protocol.Protocol, styles.Ephemeral):
             # TODO: an API for extending banana...
             if self.currentDialect == b"pb" and obj in self.outgoingSymbols:
                 symbolID = self.outgoingSymbols[obj]
-                int2b128(symbolID, write)
+                if symbolID < 0x80:
+                    write(_smallPrefixes[symbolID])
+                else:
+                    int2b128(symbolID, write)
                 write(VOCAB)
             else:
-                if len(obj) > SIZE_LIMIT:
+                length = len(obj)
+                if length > SIZE_LIMIT:
                     raise BananaError(
-                        "byte string is too long to send (%d)" % (len(obj),))
-                int2b128(len(obj), write)
+                        "byte string is too long to send (%d)" % (length,))
+                if length < 0x80:
+                    write(_smallPrefixes[length])
+                else:
+                    int2b128(length, write)
                 write(STRING)
                 write(obj)
         else:
@@ -33,6 +33,32 @@ class MathTests(unittest.TestCase):
 
 
 
+class TypeByteTests(unittest.TestCase):
+    """
+    Tests for the type byte constants which delimit Banana tokens.
+    """
+    def test_typeBytes(self):
+        """
+        Each type byte is a single-byte L{bytes} instance with its high bit
+        set.
+        """
+        typeBytes = [
+            (banana.LIST, b'\x80'),
+            (banana.INT, b'\x81'),
+            (banana.STRING, b'\x82'),
+            (banana.NEG, b'\x83'),
+            (banana.FLOAT, b'\x84'),
+            (banana.LONGINT, b'\x85'),
+            (banana.LONGNEG, b'\x86'),
+            (banana.VOCAB, b'\x87'),
+            ]
+        for typeByte, expected in typeBytes:
+            self.assertIsInstance(typeByte, bytes)
+            self.assertEqual(typeByte, expected)
+            self.assertTrue(typeByte >= banana.HIGH_BIT_SET)
+
+
+
 def selectDialect(protocol, dialect):
     """
     Dictate a Banana dialect to use.
@@ -272,6 +298,33 @@ class BananaTests(BananaTestBase):
         self.assertEqual(self.result, 1015)
 
 
+    def test_smallIntegers(self):
+        """
+        Integers with a single byte of prefix, and their neighbours which
+        need two, are encoded as C{INT} or C{NEG} tokens and round-trip
+        through banana.
+        """
+        for value in range(-130, 130):
+            prefix = BytesIO()
+            banana.int2b128(abs(value), prefix.write)
+            typeByte = banana.NEG if value < 0 else banana.INT
+            encoded = self.encode(value)
+            self.assertEqual(encoded, prefix.getvalue() + typeByte)
+            self.enc.dataReceived(encoded)
+            self.assertEqual(self.result, value)
+
+
+    def test_lengthPrefixes(self):
+        """
+        Lists and byte strings whose lengths need one or two bytes of prefix
+        round-trip through banana.
+        """
+        for length in (0, 1, 127, 128, 129):
+            for value in ([1] * length, b"x" * length):
+                self.enc.dataReceived(self.encode(value))
+                self.assertEqual(self.result, value)
+
+
     def test_negative(self):
         self.enc.sendEncoded(-1015)
         self.enc.dataReceived(self.io.getvalue())
@@ -329,6 +382,57 @@ class BananaTests(BananaTestBase):
         self.assertRaises(banana.BananaError, self.feed, data)
 
 
+    def test_prefixAtLimit(self):
+        """
+        A token whose prefix is exactly as long as the prefix limit is
+        accepted.
+        """
+        prefix = b'\x00' * (self.enc.prefixLimit - 1) + b'\x01'
+        self.enc.dataReceived(prefix + banana.INT)
+        self.assertEqual(self.result, 2 ** (7 * (self.enc.prefixLimit - 1)))
+
+
+    def test_prefixTooLong(self):
+        """
+        L{banana.Banana.dataReceived} raises L{banana.BananaError} if a
+        token's prefix is longer than the prefix limit, whether or not its
+        type byte has been received yet.
+        """
+        prefix = b'\x01' * (self.enc.prefixLimit + 1)
+        self.assertRaises(banana.BananaError, self.enc.dataReceived, prefix)
+        self.enc.buffer = b''
+        self.assertRaises(
+            banana.BananaError, self.enc.dataReceived, prefix + banana.INT)
+
+
+    def test_severalExpressions(self):
+        """
+        When one chunk holds several complete expressions followed by part
+        of another, each complete expression is delivered and the remainder
+        is kept until the rest of it arrives.
+        """
+        results = []
+        self.enc.expressionReceived = results.append
+        first = self.encode([1, b"two", 3.0])
+        second = self.encode(-4)
+        third = self.encode([b"five" * 10])
+        self.enc.dataReceived(first + second + third[:-10])
+        self.assertEqual(results, [[1, b"two", 3.0], -4])
+        self.enc.dataReceived(third[-10:])
+        self.assertEqual(results, [[1, b"two", 3.0], -4, [b"five" * 10]])
+        self.assertEqual(self.enc.buffer, b'')
+
+
+    def test_invalidTypeByte(self):
+        """
+        L{banana.Banana.dataReceived} raises L{NotImplementedError} if it
+        receives a type byte which does not correspond to any token.
+        """
+        exc = self.assertRaises(
+            NotImplementedError, self.enc.dataReceived, b'\x01\xff')
+        self.assertIn("Invalid Type Byte", str(exc))
+
+
     def test_crashString(self):
         crashString = b'\x00\x00\x00\x00\x04\x80'
         # string(size=0x0400000000, about 17.2e9)